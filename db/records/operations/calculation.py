@@ -1,6 +1,15 @@
 from sqlalchemy import func, literal, select, cast, INTEGER
 
 
+def get_extrema_diff_expr(column):
+    """
+    This function returns an expression giving the difference between the
+    max and min of the given column, evaluated as a window over the whole
+    selectable.
+    """
+    return func.max(column).over() - func.min(column).over()
+
+
 def get_extrema_diff_select(selectable, column, output_label):
     """
     This function creates a select statement composed of the given
@@ -10,10 +19,19 @@ def get_extrema_diff_select(selectable, column, output_label):
     """
     return select(
         selectable,
-        (func.max(column).over() - func.min(column).over()).label(output_label)
+        get_extrema_diff_expr(column).label(output_label)
     )
 
 
+def get_offset_order_of_magnitude_expr(column):
+    """
+    This function returns an expression giving an integer p such that p is
+    maximal, subject to the constraint that 10**(p + 1) is less than or
+    equal to the value of the given column (or expression).
+    """
+    return cast((func.floor(func.log(column)) - 1), INTEGER)
+
+
 def get_offset_order_of_magnitude_select(selectable, column, output_label):
     """
     This function returns a select statement composed of the given
@@ -24,9 +42,18 @@ def get_offset_order_of_magnitude_select(selectable, column, output_label):
     """
     return select(
         selectable,
-        cast(
-            (func.floor(func.log(column)) - 1), INTEGER
-        ).label(output_label)
+        get_offset_order_of_magnitude_expr(column).label(output_label)
+    )
+
+
+def divide_by_power_of_ten_expr(divisor_col, power_col):
+    """
+    This function returns an expression giving the floor of the given
+    divisor_col divided by 10**(the given power_col), as an integer.
+    """
+    return cast(
+        func.floor(divisor_col / func.pow(literal(10.0), power_col)),
+        INTEGER
     )
 
 
@@ -39,10 +66,5 @@ def divide_by_power_of_ten_select(selectable, divisor_col, power_col, output_lab
     """
     return select(
         selectable,
-        cast(
-            func.floor(
-                divisor_col / func.pow(literal(10.0), power_col)
-            ),
-            INTEGER
-        ).label(output_label)
+        divide_by_power_of_ten_expr(divisor_col, power_col).label(output_label)
     )
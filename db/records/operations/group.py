@@ -1,7 +1,6 @@
 from enum import Enum
-import json
 import logging
-from sqlalchemy import select, func, and_, case, literal
+from sqlalchemy import select, func, case, cast, literal, INTEGER
 
 from db.records import exceptions as records_exceptions
 from db.records.operations import calculation
@@ -10,6 +9,7 @@ from db.records.utils import create_col_objects
 logger = logging.getLogger(__name__)
 
 MATHESAR_GROUP_METADATA = '__mathesar_group_metadata'
+GROUPING_OBJECT = '__mathesar_grouping_object'
 
 
 class GroupMode(Enum):
@@ -18,6 +18,9 @@ class GroupMode(Enum):
     PERCENTILE = 'percentile'
 
 
+_VALID_GROUP_MODES = frozenset(group_mode.value for group_mode in GroupMode)
+
+
 class GroupMetadataField(Enum):
     COUNT = 'count'
     GROUP_ID = 'group_id'
@@ -33,10 +36,12 @@ class GroupBy:
     def __init__(
             self, columns, mode=GroupMode.DISTINCT.value, num_groups=None
     ):
-        self._columns = tuple(columns) if type(columns) != str else tuple([columns])
+        self._columns = tuple([columns]) if isinstance(columns, str) else tuple(columns)
         self._mode = mode
         self._num_groups = num_groups
         self._ranged = bool(mode != GroupMode.DISTINCT.value)
+        # Validated column objects, keyed by the table they were resolved on
+        self._validated_columns = {}
 
     @property
     def columns(self):
@@ -55,15 +60,17 @@ class GroupBy:
         return self._ranged
 
     def validate(self):
-        group_modes = {group_mode.value for group_mode in GroupMode}
-        if self.mode not in group_modes:
+        if self.mode not in _VALID_GROUP_MODES:
             raise records_exceptions.InvalidGroupType(
                 f'mode "{self.mode}" is invalid. valid modes are: '
-                + ', '.join([f"'{gm}'" for gm in group_modes])
+                + ', '.join([f"'{gm}'" for gm in _VALID_GROUP_MODES])
             )
         if (
                 self.mode == GroupMode.PERCENTILE.value
-                and not type(self.num_groups) == int
+                and (
+                    not isinstance(self.num_groups, int)
+                    or isinstance(self.num_groups, bool)
+                )
         ):
             raise records_exceptions.BadGroupFormat(
                 'percentile mode requires integer num_groups'
@@ -74,12 +81,14 @@ class GroupBy:
             )
 
         for col in self.columns:
-            if type(col) != str:
+            if not isinstance(col, str):
                 raise records_exceptions.BadGroupFormat(
                     f"Group column {col} must be a string."
                 )
 
     def get_validated_group_by_columns(self, table):
+        if table in self._validated_columns:
+            return self._validated_columns[table]
         self.validate()
         for col in self.columns:
             col_name = col if isinstance(col, str) else col.name
@@ -87,7 +96,8 @@ class GroupBy:
                 raise records_exceptions.GroupFieldNotFound(
                     f"Group col {col} not found in {table}."
                 )
-        return create_col_objects(table, self.columns)
+        self._validated_columns[table] = create_col_objects(table, self.columns)
+        return self._validated_columns[table]
 
 
 class GroupingWindowDefinition:
@@ -109,30 +119,44 @@ class GroupingWindowDefinition:
         return self._range
 
 
-def get_group_augmented_records_query(table, group_by):
+def get_group_augmented_records_query(table, group_by, filters=None):
     """
     Returns counts by specified groupings
 
     Args:
         table:      SQLAlchemy table object
         group_by:   GroupBy object giving args for grouping
+        filters:    list of SQLAlchemy boolean expressions on the table; rows
+                    not satisfying them are removed before grouping, so the
+                    groups (and their metadata) only describe matching rows
     """
     grouping_columns = group_by.get_validated_group_by_columns(table)
 
     if group_by.mode == GroupMode.PERCENTILE.value:
         query = _get_percentile_range_group_select(
-            table, grouping_columns, group_by.num_groups
+            table, grouping_columns, group_by.num_groups, filters=filters
         )
     elif group_by.mode == GroupMode.MAGNITUDE.value:
-        query = _get_tens_powers_range_group_select(table, grouping_columns)
+        query = _get_tens_powers_range_group_select(
+            table, grouping_columns, filters=filters
+        )
     elif group_by.mode == GroupMode.DISTINCT.value:
-        query = _get_distinct_group_select(table, grouping_columns)
+        query = _get_distinct_group_select(
+            table, grouping_columns, filters=filters
+        )
     else:
         raise records_exceptions.BadGroupFormat("Unknown error")
     return query
 
 
-def _get_distinct_group_select(table, grouping_columns):
+def _apply_filters(selectable, filters):
+    return selectable.where(*filters) if filters else selectable
+
+
+def _get_distinct_group_select(table, grouping_columns, filters=None):
+    # This select is kept flat (no subqueries or joins) so that filters and
+    # sorting applied by callers afterwards land in the same SELECT as the
+    # window functions, and only see the table's own column names.
     window_def = GroupingWindowDefinition(
         order_by=grouping_columns, partition_by=grouping_columns
     )
@@ -140,36 +164,53 @@ def _get_distinct_group_select(table, grouping_columns):
     group_id_expr = func.dense_rank().over(
         order_by=window_def.order_by, range_=window_def.range_
     )
-    return select(
-        table,
-        _get_group_metadata_definition(window_def, grouping_columns, group_id_expr)
+    return _apply_filters(
+        select(
+            table,
+            _get_group_metadata_definition(
+                window_def,
+                _get_grouping_object_expr(grouping_columns),
+                group_id_expr,
+                ranged=False
+            )
+        ),
+        filters
     )
 
 
-def _get_tens_powers_range_group_select(table, grouping_columns):
-    EXTREMA_DIFF = 'extrema_difference'
+def _get_tens_powers_range_group_select(table, grouping_columns, filters=None):
     POWER = 'power'
+    POWER_OF_TEN = 'power_of_ten'
     RAW_ID = 'raw_id'
 
     assert len(grouping_columns) == 1
     grouping_column = grouping_columns[0]
-    diff_cte = calculation.get_extrema_diff_select(
-        table, grouping_column, EXTREMA_DIFF
-    ).cte('diff_cte')
-    power_cte = calculation.get_offset_order_of_magnitude_select(
-        diff_cte, diff_cte.columns[EXTREMA_DIFF], POWER
-    ).cte('power_cte')
-    raw_id_cte = calculation.divide_by_power_of_ten_select(
-        power_cte,
-        power_cte.columns[grouping_column.name],
-        power_cte.columns[POWER],
-        RAW_ID
-    ).cte('raw_id_cte')
-    cte_main_col_list = [
-        col for col in raw_id_cte.columns if col.name == grouping_column.name
-    ]
+    # The power and raw_id are scalar functions of the extrema difference, so
+    # they're computed inline in a single pass over the table. Each group is
+    # an interval of width 10**power aligned to a multiple of that width, so
+    # its bounds stay 'pretty'. width_bucket would be a single call, but it
+    # needs fixed outer bounds and yields intervals aligned to those bounds
+    # instead, so we divide by the power of ten directly.
+    power_expr = calculation.get_offset_order_of_magnitude_expr(
+        calculation.get_extrema_diff_expr(grouping_column)
+    )
+    raw_id_subquery = _apply_filters(
+        select(
+            table,
+            power_expr.label(POWER),
+            # Both bounds of each group are multiples of 10**power, so we
+            # compute it here once per row, rather than once per bound.
+            func.pow(literal(10.0), power_expr).label(POWER_OF_TEN),
+            calculation.divide_by_power_of_ten_expr(
+                grouping_column, power_expr
+            ).label(RAW_ID),
+            _get_grouping_object_expr(grouping_columns).label(GROUPING_OBJECT),
+        ),
+        filters
+    ).subquery('raw_id_subquery')
+    main_col_list = [raw_id_subquery.columns[grouping_column.name]]
     window_def = GroupingWindowDefinition(
-        order_by=cte_main_col_list, partition_by=raw_id_cte.columns[RAW_ID]
+        order_by=main_col_list, partition_by=raw_id_subquery.columns[RAW_ID]
     )
 
     group_id_expr = func.dense_rank().over(
@@ -177,28 +218,28 @@ def _get_tens_powers_range_group_select(table, grouping_columns):
     )
 
     def _get_pretty_bound_expr(id_offset):
-        raw_id_col = raw_id_cte.columns[RAW_ID]
-        power_col = raw_id_cte.columns[POWER]
-        power_expr = func.pow(literal(10.0), power_col)
+        raw_id_col = raw_id_subquery.columns[RAW_ID]
+        power_col = raw_id_subquery.columns[POWER]
+        power_of_ten_col = raw_id_subquery.columns[POWER_OF_TEN]
         return case(
-            (power_col >= 0, func.trunc((raw_id_col + id_offset) * power_expr)),
+            (power_col >= 0, func.trunc((raw_id_col + id_offset) * power_of_ten_col)),
             else_=func.trunc(
-                (raw_id_col + id_offset) * power_expr,
+                (raw_id_col + id_offset) * power_of_ten_col,
                 ((-1) * power_col)
             )
         )
 
-    geq_expr = func.json_build_object(
+    geq_expr = func.jsonb_build_object(
         grouping_column.name, _get_pretty_bound_expr(0)
     )
-    lt_expr = func.json_build_object(
+    lt_expr = func.jsonb_build_object(
         grouping_column.name, _get_pretty_bound_expr(1)
     )
     return select(
-        *[col for col in raw_id_cte.columns if col.name in table.columns],
+        *[raw_id_subquery.columns[name] for name in table.columns.keys()],
         _get_group_metadata_definition(
             window_def,
-            cte_main_col_list,
+            raw_id_subquery.columns[GROUPING_OBJECT],
             group_id_expr,
             geq_expr=geq_expr,
             lt_expr=lt_expr,
@@ -206,35 +247,31 @@ def _get_tens_powers_range_group_select(table, grouping_columns):
     )
 
 
-def _get_percentile_range_group_select(table, columns, num_groups):
-    column_names = [col.name for col in columns]
-    # cume_dist is a PostgreSQL function that calculates the cumulative
-    # distribution.
-    # See https://www.postgresql.org/docs/13/functions-window.html
-    CUME_DIST = 'cume_dist'
+def _get_percentile_range_group_select(table, columns, num_groups, filters=None):
     RANGE_ID = 'range_id'
-    cume_dist_cte = select(
-        table,
-        func.cume_dist().over(order_by=columns).label(CUME_DIST)
-    ).cte()
-    ranges = [
-        (
-            and_(
-                cume_dist_cte.columns[CUME_DIST] > i / num_groups,
-                cume_dist_cte.columns[CUME_DIST] <= (i + 1) / num_groups
-            ),
-            i + 1
-        )
-        for i in range(num_groups)
-    ]
-
-    ranges_cte = select(
-        *[col for col in cume_dist_cte.columns if col.name != CUME_DIST],
-        case(*ranges).label(RANGE_ID)
+    # The cumulative distribution of a row is the number of rows sorting at or
+    # before it (including ties) divided by the total number of rows. A row
+    # whose cumulative distribution is in (i / n, (i + 1) / n] belongs to range
+    # i + 1, i.e., the range is the ceiling of that fraction times n. We
+    # compute the ceiling with integer division, since rounding in
+    # floating-point arithmetic would push rows sitting exactly on a range
+    # boundary into the next range. Tied rows share a cumulative
+    # distribution, and so always land in the same range.
+    # See https://www.postgresql.org/docs/13/functions-window.html
+    rows_through_current = func.count(1).over(order_by=columns, range_=(None, 0))
+    total_rows = func.count(1).over()
+    ranges_cte = _apply_filters(
+        select(
+            table,
+            cast(
+                (rows_through_current * num_groups + total_rows - 1) / total_rows,
+                INTEGER
+            ).label(RANGE_ID),
+            _get_grouping_object_expr(columns).label(GROUPING_OBJECT),
+        ),
+        filters
     ).cte()
-    ranges_aggregation_cols = [
-        col for col in ranges_cte.columns if col.name in column_names
-    ]
+    ranges_aggregation_cols = [ranges_cte.columns[col.name] for col in columns]
     window_def = GroupingWindowDefinition(
         order_by=ranges_aggregation_cols,
         partition_by=ranges_cte.columns[RANGE_ID]
@@ -242,47 +279,68 @@ def _get_percentile_range_group_select(table, columns, num_groups):
     group_id_expr = window_def.partition_by
 
     return select(
-        *[col for col in ranges_cte.columns if col.name in table.columns],
+        *[ranges_cte.columns[name] for name in table.columns.keys()],
         _get_group_metadata_definition(
-            window_def, ranges_aggregation_cols, group_id_expr
+            window_def, ranges_cte.columns[GROUPING_OBJECT], group_id_expr
         )
     )
 
 
+def _get_grouping_object_expr(grouping_columns):
+    col_key_value_tuples = (
+        (literal(str(col.name)), col) for col in grouping_columns
+    )
+    col_key_value_list = [
+        col_part for col_tuple in col_key_value_tuples for col_part in col_tuple
+    ]
+    return func.jsonb_build_object(*col_key_value_list)
+
+
 def _get_group_metadata_definition(
         window_def,
-        grouping_columns,
+        grouping_object,
         group_id_expr,
+        ranged=True,
         leq_expr=None,
         geq_expr=None,
         lt_expr=None,
         gt_expr=None,
 ):
-    col_key_value_tuples = (
-        (literal(str(col.name)), col) for col in grouping_columns
-    )
-    col_key_value_list = [
-        col_part for col_tuple in col_key_value_tuples for col_part in col_tuple
-    ]
-    inner_grouping_object = func.json_build_object(*col_key_value_list)
-
-    return func.json_build_object(
+    """
+    For ranged groupings, the grouping_object should be a column holding the
+    object built by _get_grouping_object_expr for each row, so that it's
+    computed once per row in the enclosing subquery, rather than once per
+    window using it. Otherwise, the grouping object of each row is the same as
+    that of its group, and is used directly without any window.
+    """
+    if ranged:
+        # The count is unaffected by the ordering and full frame, but giving
+        # it the same window as first_value and last_value lets PostgreSQL
+        # compute all of them in a single pass.
+        window_kwargs = dict(
+            partition_by=window_def.partition_by,
+            order_by=window_def.order_by,
+            range_=window_def.range_,
+        )
+        first_value_expr = func.first_value(grouping_object).over(**window_kwargs)
+        last_value_expr = func.last_value(grouping_object).over(**window_kwargs)
+    else:
+        # The grouping values are constant within each partition, so the
+        # first and last values are just the grouping object of any row in
+        # the group, and we can skip sorting within the partitions.
+        window_kwargs = dict(partition_by=window_def.partition_by)
+        first_value_expr = grouping_object
+        last_value_expr = grouping_object
+
+    return func.jsonb_build_object(
         literal(GroupMetadataField.GROUP_ID.value),
         group_id_expr,
         literal(GroupMetadataField.COUNT.value),
-        func.count(1).over(partition_by=window_def.partition_by),
+        func.count(1).over(**window_kwargs),
         literal(GroupMetadataField.FIRST_VALUE.value),
-        func.first_value(inner_grouping_object).over(
-            partition_by=window_def.partition_by,
-            order_by=window_def.order_by,
-            range_=window_def.range_,
-        ),
+        first_value_expr,
         literal(GroupMetadataField.LAST_VALUE.value),
-        func.last_value(inner_grouping_object).over(
-            partition_by=window_def.partition_by,
-            order_by=window_def.order_by,
-            range_=window_def.range_,
-        ),
+        last_value_expr,
         # These values are 'pretty' bounds. What 'pretty' means is based
         # on the caller, and so these expressions need to be defined by
         # that caller.
@@ -305,35 +363,24 @@ def extract_group_metadata(
     record metadata, and moves the group metadata from the data section to the
     metadata section.
     """
-    def _get_record_pieces(record):
-        data = {
-            k: v for k, v in record[data_key].items()
-            if k != MATHESAR_GROUP_METADATA
-        }
-        group_metadata = record[data_key].get(MATHESAR_GROUP_METADATA, {})
+    group_id_key = GroupMetadataField.GROUP_ID.value
+    records = []
+    groups_by_id = {}
+    for record in record_dictionaries:
+        # Copying the whole dict and popping the metadata is done in C, so
+        # it's much cheaper than filtering keys in a comprehension.
+        data = dict(record[data_key])
+        group_metadata = data.pop(MATHESAR_GROUP_METADATA, None)
         if group_metadata:
-            metadata = (
-                record.get(metadata_key, {})
-                | {
-                    GroupMetadataField.GROUP_ID.value: group_metadata.get(
-                        GroupMetadataField.GROUP_ID.value
-                    )
-                }
-            )
+            group_id = group_metadata.get(group_id_key)
+            metadata = {**record.get(metadata_key, {}), group_id_key: group_id}
+            # The group_id identifies a group within a query, so we only need
+            # to keep the first metadata object we see for each group.
+            groups_by_id.setdefault(group_id, group_metadata)
         else:
             metadata = record.get(metadata_key)
-        return (
-            {data_key: data, metadata_key: metadata},
-            group_metadata if group_metadata else None
-        )
+        records.append({data_key: data, metadata_key: metadata})
 
-    record_tup, group_tup = zip(
-        *(_get_record_pieces(record) for record in record_dictionaries)
-    )
-
-    reduced_groups = sorted(
-        [json.loads(blob) for blob in set([json.dumps(group) for group in group_tup])],
-        key=lambda x: x[GroupMetadataField.GROUP_ID.value] if x else None
-    )
+    reduced_groups = [groups_by_id[k] for k in sorted(groups_by_id)]
 
-    return list(record_tup), reduced_groups if reduced_groups != [None] else None
+    return records, reduced_groups if reduced_groups else None
@@ -91,3 +91,24 @@ def test_divide_by_power_of_ten_select(magnitude_table_obj, colname, raw_id):
         'pm_seq', 'tens_seq', 'extrema_diff', 'power', 'raw_id',
     ]
     assert res['raw_id'] == raw_id
+
+
+@pytest.mark.parametrize(
+    'colname,power,raw_id',
+    [(t[0], t[2], t[3]) for t in magnitude_columns_test_list]
+)
+def test_magnitude_exprs_inline(magnitude_table_obj, colname, power, raw_id):
+    magnitude, engine = magnitude_table_obj
+    column = magnitude.columns[colname]
+    power_expr = calculation.get_offset_order_of_magnitude_expr(
+        calculation.get_extrema_diff_expr(column)
+    )
+    sel = select(
+        magnitude,
+        power_expr.label('power'),
+        calculation.divide_by_power_of_ten_expr(column, power_expr).label('raw_id'),
+    )
+    with engine.begin() as conn:
+        res = conn.execute(sel).fetchone()
+    assert res['power'] == power
+    assert res['raw_id'] == raw_id
@@ -1,5 +1,5 @@
 import pytest
-from sqlalchemy import Column
+from sqlalchemy import Column, column, update
 
 from db.records.operations import group
 from db.records import exceptions as records_exceptions
@@ -131,6 +131,16 @@ def test_GB_validate_fails_invalid_num_group():
         gb.validate()
 
 
+def test_GB_validate_fails_bool_num_group():
+    gb = group.GroupBy(
+        columns=['col1', 'col2'],
+        mode=group.GroupMode.PERCENTILE.value,
+        num_groups=True,
+    )
+    with pytest.raises(records_exceptions.BadGroupFormat):
+        gb.validate()
+
+
 def test_GB_validate_fails_invalid_columns_len():
     gb = group.GroupBy(
         columns=['col1', 'col2'],
@@ -153,6 +163,13 @@ def test_GB_get_valid_group_by_columns_str_cols(roster_table_obj):
     )
 
 
+def test_GB_get_valid_group_by_columns_cached(roster_table_obj):
+    roster, _ = roster_table_obj
+    gb = group.GroupBy(columns=['Student Number', 'Student Email'])
+    cols = gb.get_validated_group_by_columns(roster)
+    assert gb.get_validated_group_by_columns(roster) is cols
+
+
 def test_GB_get_valid_group_by_columns_invalid_col(roster_table_obj):
     roster, _ = roster_table_obj
     input_cols = ['notintable']
@@ -220,6 +237,39 @@ def test_smoke_get_group_augmented_records_query_magnitude(magnitude_table_obj):
         )
 
 
+@pytest.mark.parametrize('group_mode', basic_group_modes)
+def test_get_group_augmented_records_query_filters(roster_table_obj, group_mode):
+    roster, engine = roster_table_obj
+    group_by = group.GroupBy(['Subject', 'Grade'], mode=group_mode, num_groups=12)
+    augmented_query = group.get_group_augmented_records_query(
+        roster, group_by, filters=[roster.columns['Grade'] > 80]
+    )
+    with engine.begin() as conn:
+        res = conn.execute(augmented_query).fetchall()
+    assert all([row['Grade'] > 80 for row in res])
+    group_counts = {
+        _group_id(row): row[group.MATHESAR_GROUP_METADATA][group.GroupMetadataField.COUNT.value]
+        for row in res
+    }
+    assert sum(group_counts.values()) == len(res)
+
+
+@pytest.mark.parametrize('group_mode', basic_group_modes)
+def test_get_group_augmented_records_query_cacheable(roster_table_obj, group_mode):
+    # SQLAlchemy reuses the compiled SQL for statements with equal cache keys,
+    # so queries differing only in parameters shouldn't need recompiling.
+    roster, _ = roster_table_obj
+    cache_keys = [
+        group.get_group_augmented_records_query(
+            roster,
+            group.GroupBy(['Subject', 'Grade'], mode=group_mode, num_groups=num_groups)
+        )._generate_cache_key()
+        for num_groups in [12, 100]
+    ]
+    assert cache_keys[0] is not None
+    assert cache_keys[0] == cache_keys[1]
+
+
 group_by_num_list = [
     (
         group.GroupBy(
@@ -275,6 +325,23 @@ def test_get_distinct_group_select_correct_num_group_id(
     assert max([_group_id(row) for row in res]) == num
 
 
+def test_percentile_group_select_one_row_per_range(roster_table_obj):
+    # Each row sits exactly on a range boundary, so this checks that none of
+    # them are rounded into the next range.
+    roster, engine = roster_table_obj
+    num_groups = 25
+    group_by = group.GroupBy(
+        ['id'], mode=group.GroupMode.PERCENTILE.value, num_groups=num_groups
+    )
+    augmented_query = group.get_group_augmented_records_query(
+        roster, group_by, filters=[roster.columns['id'] <= num_groups]
+    )
+    with engine.begin() as conn:
+        res = conn.execute(augmented_query).fetchall()
+    assert len(res) == num_groups
+    assert sorted([_group_id(row) for row in res]) == list(range(1, num_groups + 1))
+
+
 magnitude_lt_zero = ['sm_num', 'sm_dbl']
 magnitude_gt_zero = ['id', 'big_num', 'big_int', 'pm_seq', 'tens_seq']
 
@@ -379,6 +446,47 @@ def test_get_distinct_group_select_groups_distinct(roster_distinct_setup):
     )
 
 
+def test_get_distinct_group_select_null_group(roster_table_obj):
+    roster, engine = roster_table_obj
+    with engine.begin() as conn:
+        conn.execute(
+            update(roster).where(roster.columns['id'] <= 10).values(Grade=None)
+        )
+    group_by = group.GroupBy(['Grade'])
+    augmented_query = group.get_group_augmented_records_query(roster, group_by)
+    with engine.begin() as conn:
+        res = conn.execute(augmented_query).fetchall()
+    null_rows = [row for row in res if row['Grade'] is None]
+    assert len(null_rows) == 10
+    assert len({_group_id(row) for row in null_rows}) == 1
+    assert all(
+        [
+            row[group.MATHESAR_GROUP_METADATA][group.GroupMetadataField.COUNT.value] == 10
+            for row in null_rows
+        ]
+    )
+
+
+def test_get_distinct_group_select_filtered_after_grouping(roster_table_obj):
+    # get_query applies API filters to the grouped select using unqualified
+    # column names, so the filter must be unambiguous, and group ids and
+    # counts should only cover the rows that pass it.
+    roster, engine = roster_table_obj
+    group_by = group.GroupBy(['Subject', 'Grade'])
+    augmented_query = group.get_group_augmented_records_query(
+        roster, group_by
+    ).filter(column('Grade') > 80)
+    with engine.begin() as conn:
+        res = conn.execute(augmented_query).fetchall()
+    assert all([row['Grade'] > 80 for row in res])
+    group_counts = {
+        _group_id(row): row[group.MATHESAR_GROUP_METADATA][group.GroupMetadataField.COUNT.value]
+        for row in res
+    }
+    assert sorted(group_counts) == list(range(1, len(group_counts) + 1))
+    assert sum(group_counts.values()) == len(res)
+
+
 def test_get_percentile_range_group_first_last(roster_percentile_subj_grade_setup):
     res = roster_percentile_subj_grade_setup
     for row in res:
@@ -38,9 +38,11 @@ def process_annotated_records(record_list, column_name_id_map):
         split_records, data_key=DATA_KEY, metadata_key=METADATA_KEY
     )
 
-    processed_records, record_metadata = zip(
-        *tuple(tuple(d.values()) for d in combined_records)
-    )
+    processed_records = []
+    record_metadata = []
+    for record in combined_records:
+        processed_records.append(record[DATA_KEY])
+        record_metadata.append(record[METADATA_KEY])
 
     def _replace_column_names_with_ids(group_metadata_item):
         try:
@@ -63,7 +65,7 @@ def process_annotated_records(record_list, column_name_id_map):
         for i, meta in enumerate(record_metadata):
             groups_by_id[meta[group.GroupMetadataField.GROUP_ID.value]][RESULT_IDX].append(i)
 
-        output_groups = sorted(list(groups_by_id.values()), key=lambda x: x[RESULT_IDX][0])
+        output_groups = sorted(groups_by_id.values(), key=lambda x: x[RESULT_IDX][0])
     else:
         output_groups = None
 